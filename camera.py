@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+
+class Camera:
+    """
+    The part of the map drawn to the screen, following a position on the map
+
+    The view is kept inside the map, so a map smaller than the camera is drawn
+    from the top left corner of the screen.
+    """
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+
+        # Map position drawn at the top left corner of the screen
+        self.x = 0
+        self.y = 0
+
+        # The slices of the map in view
+        self.view: tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+
+    def follow(self, game_map: GameMap, x: int, y: int) -> None:
+        """Center the view on x, y without looking past the edges of the map"""
+        self.x = max(0, min(x - self.width // 2, game_map.width - self.width))
+        self.y = max(0, min(y - self.height // 2, game_map.height - self.height))
+
+        self.view = (
+            slice(self.x, min(self.x + self.width, game_map.width)),
+            slice(self.y, min(self.y + self.height, game_map.height)),
+        )
+
+    def in_view(self, x: int, y: int) -> bool:
+        """Return True if the map position x, y is drawn on the screen"""
+        return (
+            self.view[0].start <= x < self.view[0].stop
+            and self.view[1].start <= y < self.view[1].stop
+        )
+
+    def map_to_screen(self, x: int, y: int) -> tuple[int, int]:
+        """Return the screen position of a map position"""
+        return x - self.x, y - self.y
+
+    def screen_to_map(self, x: int, y: int) -> Optional[tuple[int, int]]:
+        """Return the map position drawn at a screen position, or None if no map is"""
+        map_x, map_y = x + self.x, y + self.y
+
+        if not self.in_view(map_x, map_y):
+            return None
+
+        return map_x, map_y
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Union
+
+import numpy as np
+
+Index = Union[int, slice, np.ndarray]
+
+
+def remove_spill_files(spilled: dict[tuple[int, int], np.memmap]) -> None:
+    """Delete the memmap files of spilled chunks"""
+    filenames = [memmap.filename for memmap in spilled.values()]
+    spilled.clear()
+
+    for filename in filenames:
+        if filename and os.path.exists(filename):
+            os.remove(filename)
+
+
+class ChunkedArray:
+    """
+    A 2D array stored as square chunks which are only allocated once written to
+
+    Indexing follows NumPy for the forms GameMap uses: arr[x, y] with integers,
+    slices or integer arrays, and arr["field"] for structured dtypes.  Regions are
+    returned as dense copies, so modify them through assignment (arr[x, y] = ...).
+    Unallocated chunks read as fill_value.  Converting to a NumPy array raises
+    TypeError rather than copying the whole array, read arr[:, :] if that is meant.
+
+    If spill_dir is given, the least recently used chunks beyond
+    max_resident_chunks are moved out to numpy.memmap files in that directory,
+    and paged back in the next time they are used.  Reading pages chunks in and
+    out too, so every access holds a lock, and the files left over are deleted
+    along with the array or by close.
+    """
+
+    ndim = 2
+
+    def __init__(
+        self,
+        shape: tuple[int, int],
+        dtype: Any,
+        fill_value: Any,
+        chunk_size: int = 64,
+        spill_dir: Optional[str] = None,
+        max_resident_chunks: int = 64,
+    ) -> None:
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.fill_value = np.array(fill_value, dtype=self.dtype)
+        self.chunk_size = chunk_size
+
+        self.spill_dir = spill_dir
+        self.max_resident_chunks = max_resident_chunks
+
+        # Chunks held in memory, least recently used first
+        self.chunks: OrderedDict[tuple[int, int], np.ndarray] = OrderedDict()
+        # Chunks moved out to memmap files
+        self.spilled: dict[tuple[int, int], np.memmap] = {}
+
+        self._init_paging()
+
+    def _init_paging(self) -> None:
+        # Reads from several threads would otherwise race to page the same chunk
+        self.lock = threading.RLock()
+        self._remove_spill_files = weakref.finalize(
+            self, remove_spill_files, self.spilled
+        )
+
+    def close(self) -> None:
+        """Delete the files of spilled chunks, losing their contents"""
+        with self.lock:
+            self._remove_spill_files()
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """Return the bytes used by the chunks held in memory"""
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: Union[str, tuple[Index, Index]]) -> Any:
+        if isinstance(index, str):
+            return ChunkedField(self, index)
+
+        x, y = self._normalize(index)
+
+        with self.lock:
+            if isinstance(x, np.ndarray):
+                result = self._gather(x, y)
+            elif isinstance(x, slice):
+                result = self._read_region(x, y)
+
+                # An integer drops its axis from the result, as it does in NumPy
+                dropped = self._dropped_axes(index)
+                if dropped:
+                    result = result.squeeze(axis=dropped)
+            else:
+                chunk = self._get_chunk(x // self.chunk_size, y // self.chunk_size)
+                if chunk is None:
+                    result = self.fill_value[()]
+                else:
+                    result = chunk[x % self.chunk_size, y % self.chunk_size]
+
+            self._spill_cold_chunks()
+
+        return result
+
+    def __setitem__(self, index: tuple[Index, Index], value: Any) -> None:
+        x, y = self._normalize(index)
+
+        with self.lock:
+            if isinstance(x, np.ndarray):
+                self._scatter(x, y, value)
+            elif isinstance(x, slice):
+                value = np.asarray(value, dtype=self.dtype)
+                dropped = self._dropped_axes(index)
+                if dropped and value.ndim == 1:
+                    value = np.expand_dims(value, dropped)
+
+                self._write_region(x, y, value)
+            else:
+                chunk = self._get_chunk(
+                    x // self.chunk_size, y // self.chunk_size, allocate=True
+                )
+                chunk[x % self.chunk_size, y % self.chunk_size] = value
+
+            self._spill_cold_chunks()
+
+    def __array__(self, dtype: Any = None, copy: Optional[bool] = None) -> np.ndarray:
+        # Converting would quietly copy the whole array into memory
+        raise TypeError(
+            "ChunkedArray can't be converted to a NumPy array, "
+            "read a region with arr[x, y] instead."
+        )
+
+    def _normalize(self, index: tuple[Index, Index]) -> tuple[Any, Any]:
+        """Return the index as a pair of slices, integers or integer arrays"""
+        if not isinstance(index, tuple) or len(index) != 2:
+            raise IndexError("ChunkedArray must be indexed with an x and a y index.")
+
+        x, y = index
+
+        if isinstance(x, slice) or isinstance(y, slice):
+            return self._as_slice(x, 0), self._as_slice(y, 1)
+
+        width, height = self.shape
+
+        if np.ndim(x) or np.ndim(y):
+            x, y = np.broadcast_arrays(np.asarray(x), np.asarray(y))
+            if np.any((x < -width) | (x >= width) | (y < -height) | (y >= height)):
+                raise IndexError(f"Index is out of bounds for shape {self.shape}.")
+
+            return x % width, y % height
+
+        if not (-width <= x < width and -height <= y < height):
+            raise IndexError(f"Index {index} is out of bounds for shape {self.shape}.")
+
+        return int(x) % width, int(y) % height
+
+    @staticmethod
+    def _dropped_axes(index: tuple[Index, Index]) -> tuple[int, ...]:
+        """Return the axes of a region index given as integers instead of slices"""
+        return tuple(
+            axis for axis, part in enumerate(index) if not isinstance(part, slice)
+        )
+
+    def _as_slice(self, index: Index, axis: int) -> slice:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.shape[axis])
+            if step != 1:
+                raise IndexError("ChunkedArray does not support stepped slices.")
+            return slice(start, max(start, stop))
+
+        # A single row or column, read as a region and then dropped from the result
+        start = int(index) % self.shape[axis]
+        return slice(start, start + 1)
+
+    def _get_chunk(
+        self, chunk_x: int, chunk_y: int, allocate: bool = False
+    ) -> Optional[np.ndarray]:
+        """Return a chunk, paging it back in if it was spilled"""
+        key = chunk_x, chunk_y
+        chunk = self.chunks.get(key)
+
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+
+        spilled = self.spilled.pop(key, None)
+
+        if spilled is not None:
+            chunk = np.array(spilled, order="F")
+            filename = spilled.filename
+            del spilled
+            if filename:
+                os.remove(filename)
+        elif allocate:
+            chunk = np.full(
+                (self.chunk_size, self.chunk_size), self.fill_value, order="F"
+            )
+        else:
+            return None
+
+        self.chunks[key] = chunk
+        return chunk
+
+    def _spill_cold_chunks(self) -> None:
+        """Move the least recently used chunks out to memmap files"""
+        if self.spill_dir is None:
+            return
+
+        while len(self.chunks) > self.max_resident_chunks:
+            key, chunk = self.chunks.popitem(last=False)
+
+            handle, filename = tempfile.mkstemp(suffix=".chunk", dir=self.spill_dir)
+            os.close(handle)
+
+            spilled = np.memmap(
+                filename, dtype=self.dtype, mode="w+", shape=chunk.shape, order="F"
+            )
+            spilled[:] = chunk
+            spilled.flush()
+
+            self.spilled[key] = spilled
+
+    def allocated_chunks(self) -> Iterator[tuple[tuple[slice, slice], np.ndarray]]:
+        """
+        Yield the region covered by each allocated chunk along with a copy of it
+
+        Spilled chunks are read from their files without being paged back in.
+        """
+        size = self.chunk_size
+
+        with self.lock:
+            keys = [*self.chunks, *self.spilled]
+
+        for chunk_x, chunk_y in keys:
+            x = slice(chunk_x * size, min((chunk_x + 1) * size, self.shape[0]))
+            y = slice(chunk_y * size, min((chunk_y + 1) * size, self.shape[1]))
+
+            with self.lock:
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    chunk = self.spilled[chunk_x, chunk_y]
+                region = np.array(chunk[: x.stop - x.start, : y.stop - y.start])
+
+            yield (x, y), region
+
+    def _chunks_in(
+        self, x: slice, y: slice
+    ) -> Iterator[tuple[tuple[int, int], tuple[slice, slice], tuple[slice, slice]]]:
+        """Yield each chunk overlapping a region with the overlap in chunk and region"""
+        size = self.chunk_size
+
+        for chunk_x in range(x.start // size, (x.stop - 1) // size + 1):
+            x1 = max(x.start, chunk_x * size)
+            x2 = min(x.stop, (chunk_x + 1) * size)
+
+            for chunk_y in range(y.start // size, (y.stop - 1) // size + 1):
+                y1 = max(y.start, chunk_y * size)
+                y2 = min(y.stop, (chunk_y + 1) * size)
+
+                yield (
+                    (chunk_x, chunk_y),
+                    (
+                        slice(x1 - chunk_x * size, x2 - chunk_x * size),
+                        slice(y1 - chunk_y * size, y2 - chunk_y * size),
+                    ),
+                    (
+                        slice(x1 - x.start, x2 - x.start),
+                        slice(y1 - y.start, y2 - y.start),
+                    ),
+                )
+
+    def _read_region(self, x: slice, y: slice) -> np.ndarray:
+        result = np.full(
+            (x.stop - x.start, y.stop - y.start), self.fill_value, order="F"
+        )
+
+        for key, inner, outer in self._chunks_in(x, y):
+            chunk = self._get_chunk(*key)
+            if chunk is not None:
+                result[outer] = chunk[inner]
+
+        return result
+
+    def _write_region(self, x: slice, y: slice, value: Any) -> None:
+        value = np.asarray(value, dtype=self.dtype)
+        is_fill = value.ndim == 0 and value.tobytes() == self.fill_value.tobytes()
+        value = np.broadcast_to(value, (x.stop - x.start, y.stop - y.start))
+
+        for key, inner, outer in self._chunks_in(x, y):
+            # Writing the fill value leaves unallocated chunks as they are
+            chunk = self._get_chunk(*key, allocate=not is_fill)
+            if chunk is not None:
+                chunk[inner] = value[outer]
+
+    def _gather(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        result = np.full(x.shape, self.fill_value)
+        chunk_x, chunk_y = x // self.chunk_size, y // self.chunk_size
+
+        for key in set(zip(chunk_x.flat, chunk_y.flat)):
+            chunk = self._get_chunk(*key)
+            if chunk is not None:
+                here = (chunk_x == key[0]) & (chunk_y == key[1])
+                result[here] = chunk[
+                    x[here] % self.chunk_size, y[here] % self.chunk_size
+                ]
+
+        return result
+
+    def _scatter(self, x: np.ndarray, y: np.ndarray, value: Any) -> None:
+        value = np.broadcast_to(np.asarray(value, dtype=self.dtype), x.shape)
+        chunk_x, chunk_y = x // self.chunk_size, y // self.chunk_size
+
+        for key in set(zip(chunk_x.flat, chunk_y.flat)):
+            chunk = self._get_chunk(*key, allocate=True)
+            here = (chunk_x == key[0]) & (chunk_y == key[1])
+            chunk[x[here] % self.chunk_size, y[here] % self.chunk_size] = value[here]
+
+    def __getstate__(self) -> dict:
+        # Memmap files don't outlive the game, so page every chunk back in
+        with self.lock:
+            state = self.__dict__.copy()
+            state["chunks"] = OrderedDict(self.chunks)
+            for key, spilled in self.spilled.items():
+                state["chunks"][key] = np.array(spilled, order="F")
+            state["spilled"] = {}
+
+        del state["lock"], state["_remove_spill_files"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._init_paging()
+
+
+class ChunkedField:
+    """A single field of a structured ChunkedArray, like ndarray["field"]"""
+
+    ndim = 2
+
+    def __init__(self, array: ChunkedArray, name: str) -> None:
+        self.array = array
+        self.name = name
+        self.shape = array.shape
+        self.dtype = array.dtype[name]
+
+    def __getitem__(self, index: tuple[Index, Index]) -> Any:
+        return self.array[index][self.name]
+
+    def __setitem__(self, index: tuple[Index, Index], value: Any) -> None:
+        records = self.array[index]
+        records[self.name] = value
+        self.array[index] = records
+
+    def __array__(self, dtype: Any = None, copy: Optional[bool] = None) -> np.ndarray:
+        return self.array.__array__(dtype, copy)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import random
+import threading
 from typing import TYPE_CHECKING, Optional
 
 import numpy as np
@@ -11,39 +12,129 @@ from entity import Actor
 if TYPE_CHECKING:
     from entity import Entity
 
+DIRECTIONS = [
+    (-1, -1),  # Northwest
+    (0, -1),  # North
+    (1, -1),  # Northeast
+    (-1, 0),  # West
+    (1, 0),  # East
+    (-1, 1),  # Southwest
+    (0, 1),  # South
+    (1, 1),  # Southeast
+]
+
+
+class PathCacheStats:
+    """Count how often hostile enemies reuse their path instead of computing a new one"""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+        # Enemies may decide on their actions from several threads at once
+        self.lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def record(self, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+
+path_cache_stats = PathCacheStats()
+
 
 class BaseAI(Action):
-    def perform(self) -> None:
+    # True if decide() has no side effects and uses no randomness, allowing the
+    # decisions of many actors to be made on other threads at the same time
+    decides_concurrently = False
+
+    @property
+    def is_idle(self) -> bool:
+        """Return True if this AI would only wait while the player is out of sight"""
+        return False
+
+    def on_wake(self, turns_slept: int) -> None:
+        """Catch up on the turns spent asleep"""
+        pass
+
+    def decide(self) -> Action:
+        """Return the action this AI takes on its turn"""
         raise NotImplementedError()
 
-    def get_path_to(self, dest_x: int, dest_y: int) -> list[tuple[int, int]]:
-        """Compute and return a path to the target position
+    def perform(self) -> None:
+        self.decide().perform()
+
+    def get_path_to_player(self) -> list[tuple[int, int]]:
+        """Return a path to the player by walking downhill on the map's shared distance map
         If there is no valid path then return an empty list"""
+        gamemap = self.entity.gamemap
+        distance = gamemap.distance_to_player
 
-        # Copy the walkable array
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        # The distance map may only cover part of the map, starting at offset
+        window_x, window_y = gamemap.distance_window
+        offset = window_x.start, window_y.start
+        start = self.entity.x - offset[0], self.entity.y - offset[1]
 
-        for entity in self.entity.gamemap.entities:
-            # Check that an entity blocks movement and the cost isn't zero (blocking)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked tile
-                # A lower number means more enemies will crowd behind each other in
-                # hallways. A higher number means enemies will take a longer path
-                # in order to surround the player
-                cost[entity.x, entity.y] += 10
+        width, height = distance.shape
+        if not (0 <= start[0] < width and 0 <= start[1] < height):
+            return []  # Too far from the player to have a distance
 
-        # Create a graph from the cost array and pass that graph to a new pathfinder
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
+        # Walk downhill from the start position and then remove it
+        steps = tcod.path.hillclimb2d(distance, start, True, True) + offset
+        path: list[list[int]] = steps[1:].tolist()
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position
+        if len(path) > 1 and gamemap.get_blocking_entity_at_location(*path[0]):
+            # Something is standing on the next step so try to step around it
+            detour = self.get_free_step_downhill(distance, offset)
 
-        # Compute the path and remove the start position
-        path: list[list[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+            if detour:
+                detour = detour[0] - offset[0], detour[1] - offset[1]
+                steps = tcod.path.hillclimb2d(distance, detour, True, True) + offset
+                path = steps.tolist()
 
-        # Convert from list[list[int]] to list[tuple[int, int]]
         return [(index[0], index[1]) for index in path]
 
+    def get_free_step_downhill(
+        self, distance: np.ndarray, offset: tuple[int, int] = (0, 0)
+    ) -> Optional[tuple[int, int]]:
+        """Return the unblocked neighboring tile closest to the root of the distance map
+        Only tiles closer than the current one are considered, offset is the map
+        position of the distance map's first tile"""
+        gamemap = self.entity.gamemap
+        width, height = distance.shape
+        best_step: Optional[tuple[int, int]] = None
+        best_distance = distance[self.entity.x - offset[0], self.entity.y - offset[1]]
+
+        for dx, dy in DIRECTIONS:
+            x, y = self.entity.x + dx, self.entity.y + dy
+            distance_x, distance_y = x - offset[0], y - offset[1]
+
+            if not (0 <= distance_x < width and 0 <= distance_y < height):
+                continue
+
+            if distance[distance_x, distance_y] >= best_distance:
+                continue
+
+            if gamemap.get_blocking_entity_at_location(x, y):
+                continue
+
+            best_step = x, y
+            best_distance = distance[distance_x, distance_y]
+
+        return best_step
+
 
 class ConfusedEnemy(BaseAI):
     """
@@ -57,62 +148,149 @@ class ConfusedEnemy(BaseAI):
         super().__init__(entity)
 
         self.previous_ai = previous_ai
-        self.turns_remaining = turns_remaining
+        self.expired = False
 
-    def perform(self) -> None:
-        # Revert the AI back to the original state if the effect has run its course.
-        if self.turns_remaining <= 0:
-            self.engine.message_log.add_message(
-                f"The {self.entity.name} is no longer confused."
-            )
-            self.entity.ai = self.previous_ai
-        else:
-            # Pick a random direction
-            direction_x, direction_y = random.choice(
-                [
-                    (-1, -1),  # Northwest
-                    (0, -1),  # North
-                    (1, -1),  # Northeast
-                    (-1, 0),  # West
-                    (1, 0),  # East
-                    (-1, 1),  # Southwest
-                    (0, 1),  # South
-                    (1, 1),  # Southeast
-                ]
-            )
+        # Wear off once the entity would have taken its remaining turns
+        scheduler = entity.gamemap.scheduler
+        scheduler.schedule_event(
+            scheduler.delay_for_turns(entity, turns_remaining), self.wear_off
+        )
 
-            self.turns_remaining -= 1
+    def wear_off(self) -> None:
+        """Revert the AI back to the original state as the effect has run its course"""
+        self.expired = True
 
-            # The actor will either try to move or attack in the chosen random direction.
-            # Its possible the actor will just bump into the wall, wasting a turn.
-            return BumpAction(
-                self.entity,
-                direction_x,
-                direction_y,
-            ).perform()
+        if self.entity.ai is not self:
+            return  # Dead, or confused again in the meantime
+
+        # Skip over any confusion which wore off while this one was in effect
+        previous_ai = self.previous_ai
+        while isinstance(previous_ai, ConfusedEnemy) and previous_ai.expired:
+            previous_ai = previous_ai.previous_ai
+
+        self.engine.message_log.add_message(
+            f"The {self.entity.name} is no longer confused."
+        )
+        self.entity.ai = previous_ai
+
+    def decide(self) -> Action:
+        # Pick a random direction
+        direction_x, direction_y = random.choice(DIRECTIONS)
+
+        # The actor will either try to move or attack in the chosen random direction.
+        # Its possible the actor will just bump into the wall, wasting a turn.
+        return BumpAction(
+            self.entity,
+            direction_x,
+            direction_y,
+        )
 
 
 class HostileEnemy(BaseAI):
+    decides_concurrently = True
+
     def __init__(self, entity: Actor) -> None:
         super().__init__(entity)
         self.path: list[tuple[int, int]] = []
+        self.path_index = 0  # Index of the next step to take along the path
 
-    def perform(self) -> None:
+        # A path is reused while the player, the tiles and our position are unchanged
+        self.path_key: Optional[tuple[int, int, int]] = None
+        self.path_position: Optional[tuple[int, int]] = None
+
+    @property
+    def is_idle(self) -> bool:
+        return self.path_index >= len(self.path)
+
+    def on_wake(self, turns_slept: int) -> None:
+        # Each turn spent asleep would have been spent waiting
+        self.entity.fighter.hp += turns_slept
+
+    def can_reuse_path(self, key: tuple[int, int, int]) -> bool:
+        """Return True if following the current path is the same as computing a new one"""
+        if key != self.path_key or self.path_position != (self.entity.x, self.entity.y):
+            return False
+
+        # A new path would step around anything now standing on the next step
+        if len(self.path) - self.path_index > 1:
+            next_x, next_y = self.path[self.path_index]
+            if self.entity.gamemap.get_blocking_entity_at_location(next_x, next_y):
+                return False
+
+        return True
+
+    def decide(self) -> Action:
         target = self.engine.player
         dx = target.x - self.entity.x
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance
 
+        path, path_index = self.path, self.path_index
+        path_key, path_position = self.path_key, self.path_position
+        reused_path: Optional[bool] = None
+
         if self.engine.game_map.visible[self.entity.x, self.entity.y]:
             if distance <= 1:
-                return MeleeAction(self.entity, dx, dy).perform()
+                return MeleeAction(self.entity, dx, dy)
+
+            key = (target.x, target.y, self.entity.gamemap.tiles_version)
+            reused_path = self.can_reuse_path(key)
 
-            self.path = self.get_path_to(target.x, target.y)
+            if not reused_path:
+                path = self.get_path_to_player()
+                path_index = 0
+                path_key = key
+                path_position = self.entity.x, self.entity.y
 
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
+        action: Action
+        if path_index < len(path):
+            dest_x, dest_y = path[path_index]
+            path_index += 1
+            path_position = dest_x, dest_y
+            action = MovementAction(
                 self.entity, dest_x - self.entity.x, dest_y - self.entity.y
-            ).perform()
+            )
+        else:
+            action = WaitAction(self.entity)
+
+        return PathStep(
+            self, action, (path, path_index, path_key, path_position), reused_path
+        )
+
+
+class PathStep(Action):
+    """
+    An action decided by HostileEnemy along with the path state it leaves behind
+
+    Deciding changes nothing, the state is only stored once the action has been
+    performed, so a decision which is thrown away or fails leaves the enemy where
+    it was along its path.
+    """
+
+    def __init__(
+        self,
+        ai: HostileEnemy,
+        action: Action,
+        state: tuple[
+            list[tuple[int, int]],
+            int,
+            Optional[tuple[int, int, int]],
+            Optional[tuple[int, int]],
+        ],
+        reused_path: Optional[bool],
+    ) -> None:
+        super().__init__(ai.entity)
+        self.ai = ai
+        self.action = action
+        self.state = state
+        self.reused_path = reused_path  # None if no path was looked up
+
+    def perform(self) -> None:
+        if self.reused_path is not None:
+            path_cache_stats.record(hit=self.reused_path)
+
+        # An impossible step raises here and leaves the path to be tried again
+        self.action.perform()
 
-        return WaitAction(self.entity).perform()
+        ai = self.ai
+        ai.path, ai.path_index, ai.path_key, ai.path_position = self.state
@@ -126,6 +126,9 @@ class FireballDamageConsumable(Consumable):
 
         if not targets_hit:
             raise Impossible("There are no targets in the radius.")
+
+        # The explosion can be heard from far away
+        self.engine.make_noise(*target_xy, radius=self.radius * 5)
         self.consume()
 
 
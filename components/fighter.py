@@ -62,6 +62,10 @@ class Fighter(BaseComponent):
             death_message = f"{self.parent.name} is dead!"
             death_message_color = color.enemy_die
 
+        # Re-add the actor to the map once it has become a corpse to update the registries
+        gamemap = self.gamemap
+        gamemap.remove_entity(self.parent)
+
         self.parent.char = "%"
         self.parent.color = (191, 0, 0)
         self.parent.blocks_movement = False
@@ -69,6 +73,8 @@ class Fighter(BaseComponent):
         self.parent.name = f"The remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
 
+        gamemap.add_entity(self.parent)
+
         self.engine.message_log.add_message(death_message, death_message_color)
 
         self.engine.player.level.add_xp(self.parent.level.xp_given)
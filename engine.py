@@ -1,21 +1,35 @@
 from __future__ import annotations
 
+import functools
 import lzma
 import pickle
-from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
 
+import numpy as np
 from tcod.console import Console
-from tcod.map import compute_fov
 
 import exceptions
+from actions import MovementAction
+from camera import Camera
+from components.ai import PathStep
+from hud import HUD
 from message_log import MessageLog
 import render_functions
 
 if TYPE_CHECKING:
+    from actions import Action
+    from components.ai import BaseAI
     from entity import Actor
     from game_map import GameMap, GameWorld
 
 
+@functools.lru_cache(maxsize=None)
+def get_ai_executor(workers: int) -> ThreadPoolExecutor:
+    """Return the thread pool shared by engines deciding AI actions on this many workers"""
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai")
+
+
 class Engine:
     """Manage game responsibilities such as drawing the screen, handling events, etc."""
 
@@ -30,43 +44,208 @@ class Engine:
         self.mouse_location: tuple[int, int] = (0, 0)
         self.player = player
 
+        # Number of times the enemies have taken their turns
+        self.turn = 0
+
+        # Follows the player around maps larger than the space on screen for them
+        self.camera = Camera(width=80, height=43)
+
+        # Message log, health bar and dungeon level, redrawn only when they change
+        self.hud = HUD()
+
+        # Idle actors further than this from the player, and out of sight, fall asleep
+        self.wake_radius = 12
+
+        # Threads used to decide enemy actions, 1 decides and acts one enemy at a time
+        self.ai_workers = 1
+
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
+        """Let every actor act in turn until the player is next to act"""
+        self.turn += 1
+
+        scheduler = self.game_map.scheduler
+        scheduler.end_turn(self.player)
+
+        self.update_dormancy()
+
+        # Take the distances before anyone moves so every enemy sees the same crowd
+        self.game_map.distance_to_player
+
+        if self.ai_workers > 1:
+            self.handle_enemy_turns_concurrently()
+            return
+
+        for entity in scheduler.actors_before(self.player):
             if entity.ai:
                 try:
                     entity.ai.perform()
                 except exceptions.Impossible:
                     pass  # Ignore impossible actions from npcs
 
+    def handle_enemy_turns_concurrently(self) -> None:
+        """
+        Let enemies act in batches, deciding what to do on a thread pool and then acting in turn
+
+        A batch ends before an event comes due or an actor comes up for a second turn
+        so those always see the results of the actions before them.
+        """
+        scheduler = self.game_map.scheduler
+        batch: dict[Actor, None] = {}
+
+        for entity in scheduler.actors_before(self.player):
+            if entity in batch:
+                self.perform_batch(list(batch))
+                batch.clear()
+
+            batch[entity] = None
+
+            if scheduler.next_is_event():
+                self.perform_batch(list(batch))
+                batch.clear()
+
+        self.perform_batch(list(batch))
+
+    def perform_batch(self, actors: list[Actor]) -> None:
+        """Decide the actions of all actors against the current map, then perform them"""
+        deciding = [
+            actor for actor in actors if actor.ai and actor.ai.decides_concurrently
+        ]
+        decisions: dict[Actor, tuple[BaseAI, Action]] = {}
+
+        if deciding:
+            # Build the shared distance map before the threads go looking for it
+            self.game_map.distance_to_player
+
+            executor = get_ai_executor(self.ai_workers)
+            for actor, action in zip(
+                deciding, executor.map(lambda actor: actor.ai.decide(), deciding)
+            ):
+                decisions[actor] = actor.ai, action
+
+        for actor in actors:
+            ai = actor.ai
+            if not ai:
+                continue
+
+            decided_ai, action = decisions.get(actor, (None, None))
+
+            if decided_ai is not ai or self.is_action_stale(action):
+                # Not decided yet or the map has changed under it, decide again
+                action = ai.decide()
+
+            try:
+                action.perform()
+            except exceptions.Impossible:
+                pass  # Ignore impossible actions from npcs
+
+    def is_action_stale(self, action: Optional[Action]) -> bool:
+        """Return True if an action was decided on before another actor moved in its way"""
+        if isinstance(action, PathStep):
+            action = action.action
+
+        if isinstance(action, MovementAction):
+            return bool(self.game_map.get_blocking_entity_at_location(*action.dest_xy))
+
+        return action is None
+
+    def update_dormancy(self) -> None:
+        """
+        Wake sleeping actors near the player and put idle ones far from the player to sleep
+
+        Sleeping actors are not scheduled, so they cost nothing until they are woken.
+        """
+        scheduler = self.game_map.scheduler
+
+        sleeping = list(scheduler.sleeping)
+        if sleeping:
+            for index in np.flatnonzero(self.near_player(sleeping)):
+                self.wake(sleeping[index])
+
+        awake = [actor for actor in scheduler.entries if actor is not self.player]
+        if awake:
+            for index in np.flatnonzero(~self.near_player(awake)):
+                actor = awake[index]
+                if actor.ai and actor.ai.is_idle:
+                    scheduler.sleep(actor)
+
+    def near_player(self, actors: list[Actor]) -> np.ndarray:
+        """Return a mask of the actors which are in view or within the wake radius"""
+        x, y = np.array([(actor.x, actor.y) for actor in actors]).T
+
+        distance = np.maximum(abs(x - self.player.x), abs(y - self.player.y))
+
+        return self.game_map.visible[x, y] | (distance <= self.wake_radius)
+
+    def make_noise(self, x: int, y: int, radius: int) -> None:
+        """Wake any sleeping actors within radius of x, y"""
+        sleeping = list(self.game_map.scheduler.sleeping)
+        if not sleeping:
+            return
+
+        positions = np.array([(actor.x, actor.y) for actor in sleeping])
+        heard = abs(positions - (x, y)).max(axis=1) <= radius
+
+        for index in np.flatnonzero(heard):
+            self.wake(sleeping[index])
+
+    def wake(self, actor: Actor) -> None:
+        """Wake a sleeping actor and let its AI catch up on the turns it slept"""
+        turns_slept = self.game_map.scheduler.wake(actor)
+
+        if actor.ai:
+            actor.ai.on_wake(turns_slept)
+
     def update_fov(self) -> None:
         """Recompute the field of view of the player"""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
-        )
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+        window = game_map.fov_window(x, y, radius=8)
+
+        # Only tiles near the player can change, leave the rest of the map alone
+        previous_window = game_map.visible_window
+        game_map.visible[previous_window] = False
+        game_map.visible[window] = game_map.get_fov(x, y, radius=8)
+        game_map.visible_window = window
 
         # Add visible tiles to the explored tile list
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[window] |= game_map.visible[window]
+
+        game_map.visibility_changed(previous_window)
+        game_map.visibility_changed(window)
+
+    @property
+    def world_key(self) -> tuple:
+        """Return a value which changes whenever render_world would draw something new"""
+        fighter = self.player.fighter
+
+        return (
+            self.turn,
+            id(self.game_map),
+            self.game_map.tiles_version,
+            self.message_log.version,
+            fighter.hp,
+            fighter.max_hp,
+            self.game_world.current_floor,
+        )
+
+    @property
+    def state_key(self) -> tuple:
+        """Return a value which changes whenever render would draw something new"""
+        return self.world_key, self.mouse_location
 
     def render(self, console: Console) -> None:
-        self.game_map.render(console=console)
+        self.render_world(console)
+        self.render_names(console)
 
-        self.message_log.render(console=console, x=21, y=44, width=40, height=5)
+    def render_world(self, console: Console) -> None:
+        """Draw the map and the HUD, everything but what follows the mouse"""
+        self.camera.follow(self.game_map, self.player.x, self.player.y)
+        self.game_map.render(console=console, camera=self.camera)
 
-        render_functions.render_bar_classic(
-            console=console,
-            current_value=self.player.fighter.hp,
-            maximum_value=self.player.fighter.max_hp,
-            total_width=14,
-        )
-
-        render_functions.render_dungeon_level(
-            console=console,
-            dungeon_level=self.game_world.current_floor,
-            location=(0, 42),
-        )
+        self.hud.render(console=console, engine=self)
 
+    def render_names(self, console: Console) -> None:
+        """Draw the names of what is under the mouse"""
         render_functions.render_names_at_mouse_location(
             console=console, x=1, y=1, engine=self
         )
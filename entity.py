@@ -46,7 +46,7 @@ class Entity:
         if parent:
             # If not available at initialization, set it later
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
@@ -58,19 +58,27 @@ class Entity:
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
+            if self in gamemap.entities:
+                # Already added to the new map, remove it so it is indexed at x, y
+                gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        elif hasattr(self, "parent") and self.parent is self.gamemap:
+            self.gamemap.move_entity(self, x, y)
+        else:
+            self.x = x
+            self.y = y
 
     def distance_to(self, x: int, y: int) -> float:
         """Return the distance to another entity's (x, y) coordinates"""
@@ -78,8 +86,7 @@ class Entity:
 
     def move(self, dx: int, dy: int) -> None:
         """Move the entity by a given amount"""
-        self.x += dx
-        self.y += dy
+        self.gamemap.move_entity(self, self.x + dx, self.y + dy)
 
 
 class Actor(Entity):
@@ -96,6 +103,7 @@ class Actor(Entity):
         fighter: Fighter,
         inventory: Inventory,
         level: Level,
+        speed: int = 100,
     ) -> None:
         super().__init__(
             x=x,
@@ -109,6 +117,9 @@ class Actor(Entity):
 
         self.ai: Optional[BaseAI] = ai_cls(self)
 
+        # Relative speed where 100 is normal, faster actors take more turns
+        self.speed = speed
+
         self.equipment = equipment
         self.equipment.parent = self
 
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import io
+import pickle
+import zlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from game_map import GameMap
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# Bytes the uncompressed floors may use before the least recently used are compressed
+DEFAULT_MEMORY_BUDGET = 16 * 1024 * 1024
+
+# Rough size of an entity and its components, used when estimating a floor's size
+ENTITY_SIZE_ESTIMATE = 2048
+
+
+def resident_size(game_map: GameMap) -> int:
+    """Return an estimate of the memory used by an uncompressed floor"""
+    arrays = (*vars(game_map).values(), *game_map.fov_cache.values())
+    size = sum(getattr(array, "nbytes", 0) for array in arrays)
+
+    return size + ENTITY_SIZE_ESTIMATE * len(game_map.entities)
+
+
+class FloorPickler(pickle.Pickler):
+    """Pickle a floor's entities, leaving out the engine and the map they are on"""
+
+    def __init__(self, file: io.BytesIO, engine: Engine, game_map: GameMap) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.engine = engine
+        self.game_map = game_map
+
+    def persistent_id(self, obj: Any) -> Any:
+        if obj is self.engine:
+            return "engine"
+        if obj is self.game_map:
+            return "game_map"
+        return None
+
+
+class FloorUnpickler(pickle.Unpickler):
+    """Unpickle a floor's entities onto a new map"""
+
+    def __init__(self, file: io.BytesIO, engine: Engine) -> None:
+        super().__init__(file)
+        self.engine = engine
+        self.game_map: Any = None
+
+    def persistent_load(self, pid: Any) -> Any:
+        if pid == "engine":
+            return self.engine
+        if pid == "game_map":
+            return self.game_map
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}.")
+
+
+class FloorArchive:
+    """
+    Keep every floor the player has left, compressing them to save memory
+
+    The most recently used floors are kept as they are while they fit in
+    memory_budget bytes.  Older floors are compressed down to their tile IDs,
+    their explored tiles and their entities, and decompressed again on demand.
+    """
+
+    def __init__(self, engine: Engine, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+        self.engine = engine
+        self.memory_budget = memory_budget
+
+        # Uncompressed floors by floor number, least recently used first
+        self.resident: OrderedDict[int, GameMap] = OrderedDict()
+        self.compressed: dict[int, bytes] = {}
+
+    @property
+    def floors(self) -> list[int]:
+        """Return the numbers of all archived floors"""
+        return sorted([*self.resident, *self.compressed])
+
+    def __contains__(self, floor: int) -> bool:
+        return floor in self.resident or floor in self.compressed
+
+    def __len__(self) -> int:
+        return len(self.resident) + len(self.compressed)
+
+    def store(self, floor: int, game_map: GameMap) -> None:
+        """Archive a floor the player is no longer on"""
+        self.compressed.pop(floor, None)
+        self.resident[floor] = game_map
+        self.resident.move_to_end(floor)
+
+        self.enforce_budget()
+
+    def load(self, floor: int) -> GameMap:
+        """Return an archived floor, decompressing it if needed"""
+        game_map = self.resident.get(floor)
+
+        if game_map is None:
+            game_map = self.decompress(self.compressed.pop(floor))
+            self.resident[floor] = game_map
+
+        self.resident.move_to_end(floor)
+        self.enforce_budget()
+
+        return game_map
+
+    def enforce_budget(self) -> None:
+        """Compress the least recently used floors until the rest fit in the budget"""
+        sizes = {
+            floor: resident_size(game_map) for floor, game_map in self.resident.items()
+        }
+        total = sum(sizes.values())
+
+        # The most recently used floor always stays resident
+        while total > self.memory_budget and len(self.resident) > 1:
+            floor, game_map = self.resident.popitem(last=False)
+            self.compressed[floor] = self.compress(game_map)
+            total -= sizes[floor]
+
+    def compress(self, game_map: GameMap) -> bytes:
+        """Return a floor compressed to its tile IDs, explored tiles and entities"""
+        width, height = game_map.width, game_map.height
+
+        # The whole floor is compressed, so it is read in full even when chunked
+        explored = game_map.explored[:, :].ravel(order="F")
+
+        buffer = io.BytesIO()
+
+        # The map's settings come first so it can be created before its entities load
+        pickle.dump(
+            (width, height, game_map.chunk_size, game_map.spill_dir),
+            buffer,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+        FloorPickler(buffer, self.engine, game_map).dump(
+            {
+                "tiles": game_map.tiles[:, :],
+                "explored": np.packbits(explored),
+                "downstairs_location": game_map.downstairs_location,
+                "entities": list(game_map.entities),
+                "scheduler": game_map.scheduler,
+            }
+        )
+
+        return zlib.compress(buffer.getvalue())
+
+    def decompress(self, data: bytes) -> GameMap:
+        """Return the floor compressed by compress"""
+        buffer = io.BytesIO(zlib.decompress(data))
+        width, height, chunk_size, spill_dir = pickle.load(buffer)
+
+        game_map = GameMap(
+            self.engine, width, height, chunk_size=chunk_size, spill_dir=spill_dir
+        )
+
+        unpickler = FloorUnpickler(buffer, self.engine)
+        unpickler.game_map = game_map
+        record = unpickler.load()
+
+        game_map.tiles[:, :] = record["tiles"]
+        game_map.tiles_changed()
+
+        explored = np.unpackbits(record["explored"], count=width * height)
+        game_map.explored[:, :] = explored.reshape((width, height), order="F") > 0
+
+        game_map.downstairs_location = record["downstairs_location"]
+
+        for entity in record["entities"]:
+            game_map.add_entity(entity)
+
+        # Replaced after adding the entities so their turns keep their places
+        game_map.scheduler = record["scheduler"]
+
+        return game_map
+
+    def __getstate__(self) -> dict:
+        # Saved games keep every floor compressed
+        state = self.__dict__.copy()
+        state["compressed"] = dict(self.compressed)
+        for floor, game_map in self.resident.items():
+            state["compressed"][floor] = self.compress(game_map)
+        state["resident"] = OrderedDict()
+        return state
@@ -1,16 +1,23 @@
 from __future__ import annotations
 
 import random
-from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable, Optional
 
 import numpy as np
+import tcod
 from tcod.console import Console
+from tcod.map import compute_fov
 
 import entity_factories
 import tile_types
+from chunked_array import ChunkedArray
 from entity import Actor, Item
+from render_order import RenderOrder
+from scheduler import TurnScheduler
 
 if TYPE_CHECKING:
+    from camera import Camera
     from engine import Engine
     from entity import Entity
 
@@ -40,55 +47,355 @@ monster_chances: dict[int, list[tuple[Entity, int]]] = {
     7: [(entity_factories.troll, 60)],
 }
 
+# Number of fields of view kept by each map
+FOV_CACHE_SIZE = 256
+
+# Changed windows kept before the whole map layer is redrawn instead
+MAX_DIRTY_WINDOWS = 16
+
+# Chunks of each chunked map array kept in memory before spilling to disk
+MAX_RESIDENT_CHUNKS = 64
+
+# Chunked maps only compute distances to the player this far around them
+CHUNKED_DISTANCE_RADIUS = 32
+
+# Added to the movement cost of a tile for each entity blocking it
+# A lower number means more enemies will crowd behind each other in
+# hallways. A higher number means enemies will take a longer path
+# in order to surround the player
+BLOCKING_ENTITY_COST = 10
+
 
 class GameMap:
     def __init__(
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        chunk_size: Optional[int] = None,
+        spill_dir: Optional[str] = None,
     ) -> None:
         self.engine = engine
         self.width = width
         self.height = height
-        self.entities = set(entities)
+        # Dicts are used as insertion ordered sets to keep iteration deterministic
+        self.entities: dict[Entity, None] = {}
+
+        # Index entities by their location so point lookups don't scan every entity
+        self.entity_locations: dict[tuple[int, int], list[Entity]] = {}
+
+        # Registries of entities by type, kept current as entities come and go
+        self.living_actors: dict[Actor, None] = {}
+        self.corpses: dict[Actor, None] = {}
+        self.item_registry: dict[Item, None] = {}
 
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
+        # Entities by render order, in RenderOrder order so drawing needs no sort
+        self.render_layers: dict[RenderOrder, dict[Entity, None]] = {
+            render_order: {} for render_order in RenderOrder
+        }
+
+        # Decides the order living actors on this map take their turns in
+        self.scheduler = TurnScheduler()
+
+        # Very large maps are stored in chunks which are only allocated once used
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+
+        # IDs of the tile types in tile_types.tile_table
+        self.tiles = self.new_layer(np.uint8, tile_types.wall)
 
         # Track currently visible and previously visited but no longer visible tiles
-        self.visible = np.full((width, height), fill_value=False, order="F")
-        self.explored = np.full((width, height), fill_value=False, order="F")
+        self.visible = self.new_layer(bool, False)
+        self.explored = self.new_layer(bool, False)
+
+        # The only part of visible which may contain visible tiles
+        self.visible_window: tuple[slice, slice] = (slice(0, 0), slice(0, 0))
 
         self.downstairs_location: tuple[int, int] = (0, 0)
 
+        # Bumped whenever the tiles are changed, so data derived from them can be rebuilt
+        self.tiles_version = 0
+
+        # Properties of each tile looked up from its ID, used for FOV and pathfinding
+        self.walkable: Any = None
+        self.transparent: Any = None
+        self._update_tile_properties()
+
+        # Pathfinding cost of each tile, built on first use and then kept current
+        self._movement_cost: Any = None
+
+        # Distance from every tile to the player, shared by all enemies chasing them
+        self._distance_to_player: Optional[np.ndarray] = None
+        self._distance_to_player_key: Optional[tuple[int, int, int, int]] = None
+
+        # The part of the map covered by the distance map
+        self.distance_window: tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+
+        # Recently computed fields of view, most recently used last
+        self.fov_cache: OrderedDict[tuple[int, int, int, int], np.ndarray] = (
+            OrderedDict()
+        )
+
+        # Graphics of the tiles in view as last drawn, redrawn where visibility changed
+        self._map_layer: Optional[np.ndarray] = None
+        self._map_layer_view: tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+        self._dirty_windows: list[tuple[slice, slice]] = []
+
+        # Positions and glyphs of entities in draw order, rebuilt when anything moves
+        self._entity_glyphs: Optional[
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        ] = None
+
+        for entity in entities:
+            self.add_entity(entity)
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    def new_layer(self, dtype: Any, fill_value: Any) -> Any:
+        """
+        Return a width by height array filled with fill_value
+
+        This is a NumPy array unless the map was given a chunk_size, in which case
+        it is a ChunkedArray spilling cold chunks to spill_dir, if one was given.
+        """
+        if self.chunk_size is None:
+            return np.full(
+                (self.width, self.height), fill_value=fill_value, dtype=dtype, order="F"
+            )
+
+        return ChunkedArray(
+            (self.width, self.height),
+            dtype,
+            fill_value,
+            chunk_size=self.chunk_size,
+            spill_dir=self.spill_dir,
+            max_resident_chunks=MAX_RESIDENT_CHUNKS,
+        )
+
     @property
-    def actors(self) -> Iterator[Actor]:
-        """Return an iterator over all living actors on the map"""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
+    def movement_cost(self) -> Any:
+        """
+        Return the pathfinding cost of each tile
+
+        Walls cost 0 (blocked), floors cost 1 and each entity blocking movement on a
+        tile adds to its cost.  The array is shared, callers should not modify it.
+        """
+        if self._movement_cost is None:
+            if isinstance(self.walkable, ChunkedArray):
+                self._movement_cost = self.new_layer(np.int8, self.walkable.fill_value)
+
+                for window, walkable in self.walkable.allocated_chunks():
+                    self._movement_cost[window] = walkable
+            else:
+                self._movement_cost = np.asfortranarray(self.walkable, dtype=np.int8)
+
+            for entity in self.entities:
+                if entity.blocks_movement:
+                    self._add_blocking_cost(entity.x, entity.y, BLOCKING_ENTITY_COST)
+
+        return self._movement_cost
+
+    def _add_blocking_cost(self, x: int, y: int, cost: int) -> None:
+        # Walls stay at zero so they remain impassable
+        if self._movement_cost is not None and self.walkable[x, y]:
+            self._movement_cost[x, y] += cost
+
+    @property
+    def distance_to_player(self) -> np.ndarray:
+        """
+        Return a Dijkstra map of the walking distance from every tile to the player
+
+        The map is computed once per turn and reused until the player moves or the
+        tiles change.  Tiles cost what movement_cost says they do, so a crowd of
+        enemies makes the others walk around it.  Chunked maps are too large to search
+        whole, so on those it only covers the tiles within CHUNKED_DISTANCE_RADIUS of
+        the player.  Index it by map position minus the start of distance_window.
+        """
+        player = self.engine.player
+        key = (player.x, player.y, self.tiles_version, self.engine.turn)
+
+        if self._distance_to_player is None or self._distance_to_player_key != key:
+            if self.chunk_size is None:
+                window = slice(0, self.width), slice(0, self.height)
+            else:
+                window = self.fov_window(player.x, player.y, CHUNKED_DISTANCE_RADIUS)
+
+            window_x, window_y = window
+            distance = tcod.path.maxarray(
+                (window_x.stop - window_x.start, window_y.stop - window_y.start),
+                order="F",
+            )
+            distance[player.x - window_x.start, player.y - window_y.start] = 0
+
+            self._distance_to_player = tcod.path.dijkstra2d(
+                distance, self.movement_cost[window], cardinal=2, diagonal=3
+            )
+            self._distance_to_player_key = key
+            self.distance_window = window
+
+        return self._distance_to_player
+
+    def fov_window(self, x: int, y: int, radius: int) -> tuple[slice, slice]:
+        """Return the slices of the map within radius of x, y, clipped to the map"""
+        return (
+            slice(max(0, x - radius), min(self.width, x + radius + 1)),
+            slice(max(0, y - radius), min(self.height, y + radius + 1)),
+        )
+
+    def get_fov(self, x: int, y: int, radius: int) -> np.ndarray:
+        """
+        Return the tiles visible from x, y within fov_window(x, y, radius)
+
+        Tiles never change during play, so the same position always sees the same
+        tiles.  Results are cached so waiting and backtracking don't recompute them.
+        """
+        key = (x, y, radius, self.tiles_version)
+        visible = self.fov_cache.get(key)
+
+        if visible is not None:
+            self.fov_cache.move_to_end(key)
+            return visible
+
+        # Nothing outside of the radius can be seen, so only that window is computed
+        window = self.fov_window(x, y, radius)
+        visible = compute_fov(
+            self.transparent[window],
+            (x - window[0].start, y - window[1].start),
+            radius=radius,
         )
+        visible.flags.writeable = False
+
+        self.fov_cache[key] = visible
+        if len(self.fov_cache) > FOV_CACHE_SIZE:
+            self.fov_cache.popitem(last=False)
+
+        return visible
+
+    def tiles_changed(self) -> None:
+        """Call after modifying tiles to invalidate anything derived from them"""
+        self.tiles_version += 1
+        self._update_tile_properties()
+        self._movement_cost = None
+        self.fov_cache.clear()
+        self._map_layer = None
+
+    def visibility_changed(self, window: tuple[slice, slice]) -> None:
+        """Call after modifying visible or explored within window to redraw it"""
+        if self._map_layer is None:
+            return  # The whole layer is drawn on the next render anyway
+
+        self._dirty_windows.append(window)
+
+        if len(self._dirty_windows) > MAX_DIRTY_WINDOWS:
+            self._map_layer = None
+
+    def _update_tile_properties(self) -> None:
+        walkable = tile_types.tile_table["walkable"]
+        transparent = tile_types.tile_table["transparent"]
+
+        if not isinstance(self.tiles, ChunkedArray):
+            self.walkable = np.asfortranarray(walkable[self.tiles])
+            self.transparent = np.asfortranarray(transparent[self.tiles])
+            return
+
+        # Looked up one chunk at a time so the whole map is never in memory at once
+        fill_value = self.tiles.fill_value
+        self.walkable = self.new_layer(bool, walkable[fill_value])
+        self.transparent = self.new_layer(bool, transparent[fill_value])
+
+        for window, tiles in self.tiles.allocated_chunks():
+            self.walkable[window] = walkable[tiles]
+            self.transparent[window] = transparent[tiles]
+
+    @property
+    def actors(self) -> list[Actor]:
+        """Return all living actors on the map in the order they were added"""
+        return list(self.living_actors)
 
     @property
-    def items(self) -> Iterator[Item]:
-        """Return an iterator over all items on the map"""
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def items(self) -> list[Item]:
+        """Return all items on the map in the order they were added"""
+        return list(self.item_registry)
+
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location"""
+        if entity in self.entities:
+            return
+
+        self.entities[entity] = None
+        self.entity_locations.setdefault((entity.x, entity.y), []).append(entity)
+        self.render_layers[entity.render_order][entity] = None
+        self._entity_glyphs = None
+
+        if entity.blocks_movement:
+            self._add_blocking_cost(entity.x, entity.y, BLOCKING_ENTITY_COST)
+
+        if isinstance(entity, Actor):
+            if entity.is_alive:
+                self.living_actors[entity] = None
+                self.scheduler.add(entity)
+            else:
+                self.corpses[entity] = None
+        elif isinstance(entity, Item):
+            self.item_registry[entity] = None
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map"""
+        del self.entities[entity]
+        self._unindex_location(entity)
+        del self.render_layers[entity.render_order][entity]
+        self._entity_glyphs = None
+
+        if entity.blocks_movement:
+            self._add_blocking_cost(entity.x, entity.y, -BLOCKING_ENTITY_COST)
+
+        self.living_actors.pop(entity, None)  # type: ignore
+        self.corpses.pop(entity, None)  # type: ignore
+        self.item_registry.pop(entity, None)  # type: ignore
+
+        self.scheduler.remove(entity)  # type: ignore
+
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Move an entity on this map to x, y keeping the location index current"""
+        self._unindex_location(entity)
+
+        if entity.blocks_movement:
+            self._add_blocking_cost(entity.x, entity.y, -BLOCKING_ENTITY_COST)
+            self._add_blocking_cost(x, y, BLOCKING_ENTITY_COST)
+
+        entity.x = x
+        entity.y = y
+        self.entity_locations.setdefault((x, y), []).append(entity)
+        self._entity_glyphs = None
+
+    def _unindex_location(self, entity: Entity) -> None:
+        location = (entity.x, entity.y)
+        entities_here = self.entity_locations[location]
+        entities_here.remove(entity)
+
+        if not entities_here:
+            del self.entity_locations[location]
+
+    def get_entities_at_location(self, x: int, y: int) -> list[Entity]:
+        """Return all entities at x, y"""
+        return self.entity_locations.get((x, y), [])
 
     def get_blocking_entity_at_location(self, x: int, y: int) -> Optional[Entity]:
         """Return the first entity at x, y that blocks movement"""
-        for entity in self.entities:
-            if entity.blocks_movement and entity.x == x and entity.y == y:
+        for entity in self.get_entities_at_location(x, y):
+            if entity.blocks_movement:
                 return entity
 
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
         """Return the first actor at x, y"""
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at_location(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
 
         return None
 
@@ -96,30 +403,97 @@ class GameMap:
         """Return True if x and y are inside of the bounds of the map"""
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console) -> None:
+    def map_layer(self, view: tuple[slice, slice]) -> np.ndarray:
         """
-        Renders the map to the console
+        Return the graphics of the tiles within view, a pair of slices of the map
 
         If a tile is in the "visible" array, then draw it with the "light" colors
         If it isn't, but it's in the "explored" array, then draw it with the "dark" colors
         Otherwise, the default is "SHROUD"
         """
-        console.tiles_rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
-            default=tile_types.SHROUD,
-        )
+        view_x, view_y = view
+
+        if self._map_layer is None or view != self._map_layer_view:
+            self._map_layer = np.empty(
+                (view_x.stop - view_x.start, view_y.stop - view_y.start),
+                dtype=tile_types.graphic_dt,
+                order="F",
+            )
+            self._map_layer_view = view
+            self._dirty_windows = [view]
+
+        for window_x, window_y in self._dirty_windows:
+            # Only the part of the window in view is drawn
+            x = slice(
+                max(window_x.start, view_x.start), min(window_x.stop, view_x.stop)
+            )
+            y = slice(
+                max(window_y.start, view_y.start), min(window_y.stop, view_y.stop)
+            )
+
+            if x.start >= x.stop or y.start >= y.stop:
+                continue
+
+            tiles = self.tiles[x, y]
+
+            self._map_layer[
+                x.start - view_x.start : x.stop - view_x.start,
+                y.start - view_y.start : y.stop - view_y.start,
+            ] = np.select(
+                condlist=[self.visible[x, y], self.explored[x, y]],
+                choicelist=[
+                    tile_types.tile_table["light"][tiles],
+                    tile_types.tile_table["dark"][tiles],
+                ],
+                default=tile_types.SHROUD,
+            )
+
+        self._dirty_windows.clear()
+
+        return self._map_layer
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
-
-        for entity in entities_sorted_for_rendering:
-            # Only draw entities that are in the "visible" array
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                )
+    @property
+    def entity_glyphs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the x, y, codepoint and color of every entity, in draw order"""
+        if self._entity_glyphs is None:
+            entities = [
+                entity for layer in self.render_layers.values() for entity in layer
+            ]
+
+            self._entity_glyphs = (
+                np.array([entity.x for entity in entities], dtype=np.intp),
+                np.array([entity.y for entity in entities], dtype=np.intp),
+                np.array([ord(entity.char) for entity in entities], dtype=np.int32),
+                np.array([entity.color for entity in entities], dtype=np.uint8).reshape(
+                    -1, 3
+                ),
+            )
+
+        return self._entity_glyphs
+
+    def render(self, console: Console, camera: Camera) -> None:
+        """Renders the part of the map in view of the camera and the entities on it"""
+        view_x, view_y = camera.view
+        console.tiles_rgb[
+            0 : view_x.stop - view_x.start, 0 : view_y.stop - view_y.start
+        ] = self.map_layer(camera.view)
+
+        x, y, ch, fg = self.entity_glyphs
+        in_view = (view_x.start <= x) & (x < view_x.stop)
+        in_view &= (view_y.start <= y) & (y < view_y.stop)
+        x, y, ch, fg = x[in_view], y[in_view], ch[in_view], fg[in_view]
+
+        # Only draw entities that are in the "visible" array
+        visible = self.visible[x, y]
+        x, y, ch, fg = x[visible], y[visible], ch[visible], fg[visible]
+
+        # Of the entities sharing a tile, the last in draw order is the one shown
+        _, last_reversed = np.unique((x * self.height + y)[::-1], return_index=True)
+        shown = len(x) - 1 - last_reversed
+
+        x, y = x[shown] - camera.x, y[shown] - camera.y
+        console.ch[x, y] = ch[shown]
+        console.fg[x, y] = fg[shown]
 
 
 class GameWorld:
@@ -132,16 +506,38 @@ class GameWorld:
         map_width: int,
         map_height: int,
         current_floor: int = 0,
+        chunk_size: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        floor_memory_budget: Optional[int] = None,
     ) -> None:
+        from floor_archive import DEFAULT_MEMORY_BUDGET, FloorArchive
+
         self.engine = engine
 
         self.map_width = map_width
         self.map_height = map_height
 
+        # Passed on to each GameMap, see GameMap.new_layer
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+
         self.current_floor = current_floor
 
+        # Every floor the player has left, by floor number
+        self.floors = FloorArchive(
+            engine,
+            memory_budget=(
+                DEFAULT_MEMORY_BUDGET
+                if floor_memory_budget is None
+                else floor_memory_budget
+            ),
+        )
+
     def generate_floor(self) -> None:
         """Increment floor number and generate new floor type"""
+        previous_floor = self.current_floor
+        previous_map: Optional[GameMap] = getattr(self.engine, "game_map", None)
+
         self.current_floor += 1
 
         if random.randrange(100) < 70:
@@ -149,6 +545,16 @@ class GameWorld:
         else:
             self.generate_procgen_floor()
 
+        if previous_map is not None:
+            self.floors.store(previous_floor, previous_map)
+
+    def get_floor(self, floor: int) -> GameMap:
+        """Return the map of the current floor or of a floor the player has left"""
+        if floor == self.current_floor:
+            return self.engine.game_map
+
+        return self.floors.load(floor)
+
     def generate_paper_floor(self) -> None:
         # Generate a "paper" dungeon most of the time
         from paperdungeon import generate_paper_dungeon
@@ -200,7 +606,7 @@ class GameWorld:
         room_min_size = 6
         room_max_size = 10
 
-        max_rooms = 30
+        max_rooms = 10
 
         self.engine.game_map = generate_dungeon(
             max_rooms=max_rooms,
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Hashable, Optional
+
+import tcod
+
+import render_functions
+
+if TYPE_CHECKING:
+    from tcod import Console
+
+    from engine import Engine
+
+
+class Panel:
+    """
+    A part of the HUD drawn into its own console, only redrawn when its key changes
+
+    Panels draw like they would on the screen directly: any cell, or color of a
+    cell, which draw leaves alone shows whatever is underneath the panel.
+    """
+
+    def __init__(self, x: int, y: int, width: int, height: int) -> None:
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+        self.console = tcod.Console(width, height, order="F")
+        self.last_key: Optional[Hashable] = None
+
+        # Where draw changed the character, foreground and background of a cell
+        self.drawn_ch = self.console.ch != self.console.ch
+        self.drawn_fg = self.drawn_ch
+        self.drawn_bg = self.drawn_ch
+
+    def key(self, engine: Engine) -> Hashable:
+        """Return the inputs of draw, the panel is redrawn whenever they change"""
+        raise NotImplementedError()
+
+    def draw(self, console: Console, engine: Engine) -> None:
+        """Draw the panel with its top left corner at 0, 0"""
+        raise NotImplementedError()
+
+    def update(self, engine: Engine) -> None:
+        """Redraw the panel if its key has changed"""
+        key = self.key(engine)
+
+        if key == self.last_key:
+            return
+
+        # Draw over two different blank consoles, the parts which differ were not drawn
+        consoles = []
+        for blank_ch, blank_color in ((0, (0, 0, 0)), (1, (255, 255, 255))):
+            console = tcod.Console(self.width, self.height, order="F")
+            console.clear(ch=blank_ch, fg=blank_color, bg=blank_color)
+            self.draw(console, engine)
+            consoles.append(console)
+
+        first, second = consoles
+
+        self.console = first
+        self.drawn_ch = first.ch == second.ch
+        self.drawn_fg = (first.fg == second.fg).all(axis=2)
+        self.drawn_bg = (first.bg == second.bg).all(axis=2)
+        self.last_key = key
+
+    def render(self, console: Console, engine: Engine) -> None:
+        """Draw the panel onto the screen, redrawing it first if needed"""
+        self.update(engine)
+
+        area = slice(self.x, self.x + self.width), slice(self.y, self.y + self.height)
+
+        for screen, panel, drawn in (
+            (console.ch[area], self.console.ch, self.drawn_ch),
+            (console.fg[area], self.console.fg, self.drawn_fg),
+            (console.bg[area], self.console.bg, self.drawn_bg),
+        ):
+            screen[drawn] = panel[drawn]
+
+
+class MessageLogPanel(Panel):
+    def __init__(self) -> None:
+        super().__init__(x=21, y=44, width=40, height=5)
+
+    def key(self, engine: Engine) -> Hashable:
+        return engine.message_log.version
+
+    def draw(self, console: Console, engine: Engine) -> None:
+        engine.message_log.render(
+            console=console, x=0, y=0, width=self.width, height=self.height
+        )
+
+
+class HealthBarPanel(Panel):
+    def __init__(self) -> None:
+        super().__init__(x=1, y=45, width=30, height=3)
+
+    def key(self, engine: Engine) -> Hashable:
+        return engine.player.fighter.hp, engine.player.fighter.max_hp
+
+    def draw(self, console: Console, engine: Engine) -> None:
+        render_functions.render_bar_classic(
+            console=console,
+            current_value=engine.player.fighter.hp,
+            maximum_value=engine.player.fighter.max_hp,
+            total_width=14,
+            location=(0, 0),
+        )
+
+
+class DungeonLevelPanel(Panel):
+    def __init__(self) -> None:
+        super().__init__(x=0, y=42, width=80, height=1)
+
+    def key(self, engine: Engine) -> Hashable:
+        return engine.game_world.current_floor
+
+    def draw(self, console: Console, engine: Engine) -> None:
+        render_functions.render_dungeon_level(
+            console=console,
+            dungeon_level=engine.game_world.current_floor,
+            location=(0, 0),
+        )
+
+
+class HUD:
+    """Draw panels over the screen, in order, redrawing each only when it changes"""
+
+    def __init__(self, panels: Optional[list[Panel]] = None) -> None:
+        if panels is None:
+            panels = [MessageLogPanel(), HealthBarPanel(), DungeonLevelPanel()]
+
+        self.panels = panels
+
+    def render(self, console: Console, engine: Engine) -> None:
+        for panel in self.panels:
+            panel.render(console, engine)
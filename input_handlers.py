@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Callable, Optional, Union
+from typing import TYPE_CHECKING, Callable, Hashable, Iterable, Optional, Union
 
+import numpy as np
 import tcod
 
 import actions
@@ -64,6 +65,66 @@ MainGameEventHandler will become the active handler.
 """
 
 
+class RenderCache:
+    """
+    Keep a copy of what was drawn to the screen, drawing again only when its key changes
+
+    Used by handlers to draw what lies underneath them, a None key always draws.
+    """
+
+    def __init__(self) -> None:
+        self.key: Optional[Hashable] = None
+        self.tiles: Optional[np.ndarray] = None
+
+    def render(
+        self,
+        console: tcod.Console,
+        key: Optional[Hashable],
+        draw: Callable[[tcod.Console], None],
+    ) -> None:
+        if (
+            key is None
+            or key != self.key
+            or self.tiles is None
+            or self.tiles.shape != console.tiles_rgb.shape
+        ):
+            draw(console)
+            self.key = key
+            self.tiles = console.tiles_rgb.copy()
+        else:
+            console.tiles_rgb[...] = self.tiles
+
+
+class EventCoalescer:
+    """
+    Merge runs of events where only the last one matters before they are handled
+
+    Consecutive mouse motion is merged into the latest motion, since handlers only
+    use where the mouse ends up.  Key repeats are all kept, each one moves the
+    player or the cursor.
+    """
+
+    def __init__(self) -> None:
+        # Number of events merged away
+        self.collapsed = 0
+
+    def coalesce(self, events: Iterable[tcod.event.Event]) -> list[tcod.event.Event]:
+        coalesced: list[tcod.event.Event] = []
+
+        for event in events:
+            if (
+                isinstance(event, tcod.event.MouseMotion)
+                and coalesced
+                and isinstance(coalesced[-1], tcod.event.MouseMotion)
+            ):
+                coalesced[-1] = event
+                self.collapsed += 1
+            else:
+                coalesced.append(event)
+
+        return coalesced
+
+
 class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next handler to use"""
@@ -73,6 +134,16 @@ class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
         assert not isinstance(state, Action), f"{self!r} can not handle actions."
         return self
 
+    @property
+    def render_key(self) -> Optional[Hashable]:
+        """
+        Return a value which changes whenever on_render would draw something new
+
+        The screen is only redrawn when this changes.  None means it can't tell,
+        so the screen is redrawn after every event.
+        """
+        return None
+
     def on_render(self, console: tcod.Console) -> None:
         raise NotImplementedError()
 
@@ -87,11 +158,21 @@ class PopupMessage(BaseEventHandler):
         self.parent = parent_handler
         self.text = text
 
+        # The dimmed parent, which doesn't change while the popup is open
+        self.background = RenderCache()
+
+    @property
+    def render_key(self) -> Optional[Hashable]:
+        parent_key = self.parent.render_key
+
+        if parent_key is None:
+            return None
+
+        return type(self), self.text, parent_key
+
     def on_render(self, console: tcod.Console) -> None:
         """Render the parent and dim the result then print the message on top"""
-        self.parent.on_render(console)
-        console.tiles_rgb["fg"] //= 8
-        console.tiles_rgb["bg"] //= 8
+        self.background.render(console, self.parent.render_key, self.render_dimmed)
 
         console.print(
             console.width // 2,
@@ -102,6 +183,11 @@ class PopupMessage(BaseEventHandler):
             alignment=tcod.CENTER,
         )
 
+    def render_dimmed(self, console: tcod.Console) -> None:
+        self.parent.on_render(console)
+        console.tiles_rgb["fg"] //= 8
+        console.tiles_rgb["bg"] //= 8
+
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[BaseEventHandler]:
         """Return to the parent handler when any key is pressed"""
         return self.parent
@@ -113,6 +199,10 @@ class EventHandler(BaseEventHandler):
     def __init__(self, engine: Engine) -> None:
         self.engine = engine
 
+    @property
+    def render_key(self) -> Optional[Hashable]:
+        return type(self), self.engine.state_key
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle events for input handlers with an engine."""
         action_or_state = self.dispatch(event)
@@ -146,8 +236,10 @@ class EventHandler(BaseEventHandler):
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
+        location = self.engine.camera.screen_to_map(event.tile.x, event.tile.y)
+
+        if location and self.engine.game_map.in_bounds(*location):
+            self.engine.mouse_location = location
 
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
@@ -156,6 +248,17 @@ class EventHandler(BaseEventHandler):
 class AskUserEventHandler(EventHandler):
     """Handles user input for actions which require special input"""
 
+    def __init__(self, engine: Engine) -> None:
+        super().__init__(engine)
+
+        # The game underneath, only drawn again once the game has changed
+        self.background = RenderCache()
+
+    def on_render(self, console: tcod.Console) -> None:
+        # Names follow the mouse, so they are drawn over the cached game every time
+        self.background.render(console, self.engine.world_key, self.engine.render_world)
+        self.engine.render_names(console)
+
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
         """By default any key exits this input handler"""
         if event.sym in {  # Ignore modifier keys.
@@ -179,6 +282,14 @@ class AskUserEventHandler(EventHandler):
         """Return to the main event handler"""
         return MainGameEventHandler(self.engine)
 
+    @property
+    def menu_x(self) -> int:
+        """Return the screen column for a menu, on the side away from the player"""
+        player = self.engine.player
+        player_x, _ = self.engine.camera.map_to_screen(player.x, player.y)
+
+        return 40 if player_x <= 30 else 1
+
 
 class CharacterScreenEventHandler(AskUserEventHandler):
     TITLE = "Character Information"
@@ -186,10 +297,7 @@ class CharacterScreenEventHandler(AskUserEventHandler):
     def on_render(self, console: tcod.Console) -> None:
         super().on_render(console)
 
-        if self.engine.player.x <= 30:
-            x = 40
-        else:
-            x = 1
+        x = self.menu_x
 
         y = 1
 
@@ -232,10 +340,7 @@ class LevelUpEventHandler(AskUserEventHandler):
     def on_render(self, console: tcod.Console) -> None:
         super().on_render(console)
 
-        if self.engine.player.x <= 30:
-            x = 40
-        else:
-            x = 1
+        x = self.menu_x
 
         y = 1
 
@@ -312,10 +417,7 @@ class InventoryEventHandler(AskUserEventHandler):
         if height <= 3:
             height = 3
 
-        if self.engine.player.x <= 30:
-            x = 40
-        else:
-            x = 1
+        x = self.menu_x
 
         y = 1
 
@@ -407,7 +509,7 @@ class SelectIndexHandler(AskUserEventHandler):
     def on_render(self, console: tcod.Console) -> None:
         """Highlight the tile under the cursor."""
         super().on_render(console)
-        x, y = self.engine.mouse_location
+        x, y = self.engine.camera.map_to_screen(*self.engine.mouse_location)
         console.tiles_rgb["bg"][x, y] = color.white
         console.tiles_rgb["fg"][x, y] = color.black
 
@@ -427,9 +529,10 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            # Clamp the cursor index to the map size.
-            x = max(0, min(x, self.engine.game_map.width - 1))
-            y = max(0, min(y, self.engine.game_map.height - 1))
+            # Clamp the cursor index to the part of the map on screen.
+            view_x, view_y = self.engine.camera.view
+            x = max(view_x.start, min(x, view_x.stop - 1))
+            y = max(view_y.start, min(y, view_y.stop - 1))
             self.engine.mouse_location = x, y
             return None
         elif key in CONFIRM_KEYS:
@@ -440,9 +543,11 @@ class SelectIndexHandler(AskUserEventHandler):
         self, event: tcod.event.MouseButtonDown
     ) -> Optional[ActionOrHandler]:
         """Left click confirms a selection."""
-        if self.engine.game_map.in_bounds(*event.tile):
+        location = self.engine.camera.screen_to_map(*event.tile)
+
+        if location and self.engine.game_map.in_bounds(*location):
             if event.button == 1:
-                return self.on_index_selected(*event.tile)
+                return self.on_index_selected(*location)
         return super().ev_mousebuttondown(event)
 
     def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
@@ -490,7 +595,7 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         """Highlight the tile under the cursor."""
         super().on_render(console)
 
-        x, y = self.engine.mouse_location
+        x, y = self.engine.camera.map_to_screen(*self.engine.mouse_location)
 
         # Draw a rectangle around the targeted area, so the player can see the affected tiles.
         console.draw_frame(
@@ -593,10 +698,35 @@ class HistoryViewer(EventHandler):
         self.log_length = len(engine.message_log.messages)
         self.cursor = self.log_length - 1
 
+        # The game underneath and the log window, each drawn again only once changed
+        self.background = RenderCache()
+        self.log_console: Optional[tcod.Console] = None
+        self.log_console_key: Optional[Hashable] = None
+
+    @property
+    def render_key(self) -> Optional[Hashable]:
+        return super().render_key, self.cursor
+
     def on_render(self, console: tcod.Console) -> None:
-        super().on_render(console)  # Draw the main state as the background.
+        # Draw the main state as the background.
+        self.background.render(console, self.engine.state_key, super().on_render)
+
+        key = (
+            self.cursor,
+            self.engine.message_log.version,
+            console.width,
+            console.height,
+        )
 
-        log_console = tcod.Console(console.width - 6, console.height - 6)
+        if self.log_console is None or key != self.log_console_key:
+            self.log_console = self.render_log(console.width - 6, console.height - 6)
+            self.log_console_key = key
+
+        self.log_console.blit(console, 3, 3)
+
+    def render_log(self, width: int, height: int) -> tcod.Console:
+        """Return a console showing the message history up to the cursor"""
+        log_console = tcod.Console(width, height)
 
         # Draw a frame with a custom banner title.
         log_console.draw_frame(0, 0, log_console.width, log_console.height)
@@ -613,7 +743,8 @@ class HistoryViewer(EventHandler):
             log_console.height - 2,
             self.engine.message_log.messages[: self.cursor + 1],
         )
-        log_console.blit(console, 3, 3)
+
+        return log_console
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[MainGameEventHandler]:
         # Fancy conditional movement to make it feel right.
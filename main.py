@@ -1,4 +1,6 @@
+import time
 import traceback
+from typing import Hashable, Optional
 
 import tcod
 
@@ -7,6 +9,9 @@ import exceptions
 import input_handlers
 import setup_game
 
+# Most frames per second to draw, None draws every change as soon as it happens
+MAX_FPS: Optional[int] = None
+
 
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
     """Save the game to a file if the current event handler has an active Engine"""
@@ -47,15 +52,42 @@ def main() -> None:
     ) as context:
         root_console = tcod.Console(screen_width, screen_height, order="F")
 
+        coalescer = input_handlers.EventCoalescer()
+
+        # Only redraw when the handler reports that something on screen changed
+        last_render_key: Optional[Hashable] = None
+        next_frame_time = 0.0
+
         try:
             while True:
-                root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
+                render_key = handler.render_key
+                timeout: Optional[float] = None
+
+                if render_key is None or render_key != last_render_key:
+                    now = time.perf_counter()
+
+                    if now >= next_frame_time:
+                        root_console.clear()
+                        handler.on_render(console=root_console)
+                        context.present(root_console)
+
+                        last_render_key = render_key
+                        if MAX_FPS:
+                            next_frame_time = now + 1 / MAX_FPS
+
+                            if render_key is None:
+                                timeout = 1 / MAX_FPS  # Keep updating continuously
+                    else:
+                        # Too soon for another frame, wake up in time for the next one
+                        timeout = next_frame_time - now
 
                 try:
-                    for event in tcod.event.wait():
+                    for event in coalescer.coalesce(tcod.event.wait(timeout)):
                         context.convert_event(event)
+
+                        if isinstance(event, tcod.event.WindowEvent):
+                            last_render_key = None  # The window may need repainting
+
                         handler = handler.handle_events(event)
                 except Exception:  # Handle exceptions in game.
                     traceback.print_exc()  # Print error to stderr.
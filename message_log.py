@@ -23,6 +23,9 @@ class MessageLog:
     def __init__(self) -> None:
         self.messages: list[Message] = []
 
+        # Incremented whenever a message is added or stacked
+        self.version = 0
+
     def add_message(
         self, text: str, fg: tuple[int, int, int] = color.white, *, stack: bool = True
     ) -> None:
@@ -32,6 +35,8 @@ class MessageLog:
         fg - text color
         stack - if True, messages will be stacked with previous messages of the same type
         """
+        self.version += 1
+
         if stack and self.messages and self.messages[-1].plain_text == text:
             self.messages[-1].count += 1
         else:
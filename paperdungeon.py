@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import math
 import random
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Optional, Union
+
+import numpy as np
 
 import entity_factories
 import tile_types
@@ -84,30 +86,43 @@ class RectangularRoom:
 
 
 class Point:
-    def __init__(self, x, y):
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: int, y: int) -> None:
         self.x = x
         self.y = y
 
     @staticmethod
     def UP() -> Point:
-        return Point(0, -1)
+        return UP
 
     @staticmethod
     def DOWN() -> Point:
-        return Point(0, 1)
+        return DOWN
 
     @staticmethod
     def LEFT() -> Point:
-        return Point(-1, 0)
+        return LEFT
 
     @staticmethod
     def RIGHT() -> Point:
-        return Point(1, 0)
+        return RIGHT
 
     def __add__(self, other: Point) -> Point:
         return Point(self.x + other.x, self.y + other.y)
 
 
+# Shared directions, Points are never modified once created
+UP = Point(0, -1)
+DOWN = Point(0, 1)
+LEFT = Point(-1, 0)
+RIGHT = Point(1, 0)
+
+# Labels of the cells in Dungeon.grid, rooms are labelled with their index + 1
+EMPTY = 0
+CORRIDOR = -1
+
+
 class Room:
     def __init__(self, room: RectangularRoom, is_room: bool = True) -> None:
         self.room = room
@@ -115,6 +130,64 @@ class Room:
         self.is_room = is_room
 
 
+class GenerationStats:
+    """Count the corridors paper dungeons attempt and how many of them add a room"""
+
+    def __init__(self) -> None:
+        self.attempts = 0
+        self.successes = 0
+
+    @property
+    def success_rate(self) -> float:
+        return self.successes / self.attempts if self.attempts else 0.0
+
+    def record(self, dungeon: Dungeon) -> None:
+        self.attempts += dungeon.attempts
+        self.successes += dungeon.successes
+
+    def reset(self) -> None:
+        self.attempts = 0
+        self.successes = 0
+
+
+generation_stats = GenerationStats()
+
+
+class Frontier:
+    """Rooms with walls left to start corridors from, sampled and removed in O(1)"""
+
+    def __init__(self) -> None:
+        self.rooms: list[Room] = []
+
+        # Position of every room in rooms
+        self.index: dict[Room, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.rooms)
+
+    def __contains__(self, room: Room) -> bool:
+        return room in self.index
+
+    def add(self, room: Room) -> None:
+        if room not in self.index:
+            self.index[room] = len(self.rooms)
+            self.rooms.append(room)
+
+    def discard(self, room: Room) -> None:
+        """Remove a room, moving the last room into its place"""
+        index = self.index.pop(room, None)
+        if index is None:
+            return
+
+        last = self.rooms.pop()
+        if last is not room:
+            self.rooms[index] = last
+            self.index[last] = index
+
+    def sample(self) -> Room:
+        return self.rooms[random.randrange(len(self.rooms))]
+
+
 def place_entities(
     room: RectangularRoom,
     dungeon: GameMap,
@@ -139,7 +212,7 @@ def place_entities(
         x = random.randint(room.x1 + 1, room.x2 - 1)
         y = random.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+        if not dungeon.get_entities_at_location(x, y):
             entity.spawn(dungeon, x, y)
 
 
@@ -188,7 +261,14 @@ def generate_paper_dungeon(
     """Generate a new dungeon map using randomly placed non-overlapping rooms"""
     """We may generate fewer than max rooms due to room collisions"""
     player = engine.player
-    map = GameMap(engine, map_width, map_height, entities=[player])
+    map = GameMap(
+        engine,
+        map_width,
+        map_height,
+        entities=[player],
+        chunk_size=engine.game_world.chunk_size,
+        spill_dir=engine.game_world.spill_dir,
+    )
 
     # Create the initial dungeon generator
     dungeon = Dungeon(map_width=map_width, map_height=map_height)
@@ -204,8 +284,13 @@ def generate_paper_dungeon(
     )
 
     for _ in range(complexity * 8):
+        if not dungeon.frontier:
+            break  # Every wall of every room has been used
+
+        dungeon.attempts += 1
+
         new_room = dungeon.add_random_corridor(
-            room=dungeon.get_random_room(),
+            room=dungeon.frontier.sample(),
             length=random.randrange(min_corridor_length, max_corridor_length),
             connecting=False,
         )
@@ -214,17 +299,16 @@ def generate_paper_dungeon(
             # Attempt to create room at end of corridor
             w = random.randrange(room_min_size, room_max_size)
             h = random.randrange(room_min_size, room_max_size)
-            dungeon.add_room(RectangularRoom(new_room.x - 1, new_room.y - 1, w, h))
+            if dungeon.add_room(RectangularRoom(new_room.x - 1, new_room.y - 1, w, h)):
+                dungeon.successes += 1
 
-    # "Completed" dungeon generation
+    generation_stats.record(dungeon)
 
-    # Create the map from the dungeon
-    for corridor_cell in dungeon.corridors:
-        map.tiles[corridor_cell.x][corridor_cell.y] = tile_types.floor
+    # "Completed" dungeon generation
 
-    # Add rooms and corridors to tilemap
-    for room in dungeon.rooms:
-        map.tiles[room.room.inner] = tile_types.floor
+    # Create the map from the dungeon, adding rooms and corridors to the tilemap
+    floor_x, floor_y = np.nonzero(dungeon.grid[:map_width, :map_height])
+    map.tiles[floor_x, floor_y] = tile_types.floor
 
     # Place the player somewhere in the dungeon
     start_room = dungeon.rooms[random.randrange(len(dungeon.rooms))]
@@ -258,16 +342,22 @@ def generate_paper_dungeon(
     map.tiles[exit_room.room.center] = tile_types.down_stairs
     map.downstairs_location = exit_room.room.center
 
+    map.tiles_changed()
+
     return map
 
 
 class Dungeon:
     def __init__(self, map_width: int, map_height: int, padding: int = 4) -> None:
-        # Track rooms and doors
-        self.data: dict = {}
-        self.doorPos: dict = {}
+        # Track rooms
         self.rooms: list[Room] = []
-        self.corridors: list[Point] = []
+
+        # Rooms which still have walls to start corridors from
+        self.frontier = Frontier()
+
+        # Corridors attempted while generating and how many of them added a room
+        self.attempts = 0
+        self.successes = 0
 
         # Configure "padding" around the map to keep rooms from being placed on the edge
         self.padding = padding
@@ -277,19 +367,33 @@ class Dungeon:
             padding, padding, map_width - (padding * 2), map_height - (padding * 2)
         )
 
+        # Label of every cell, with room for the far borders which are inclusive
+        self.grid = np.full((map_width + 1, map_height + 1), EMPTY, dtype=np.int32)
+
+        # Inclusive x and y ranges of the cells a corridor may use, keeping padding
+        # cells between every corridor and the borders
+        self.corridor_limits = (
+            (self.borders.x1 + padding, self.borders.x2 - padding - 1),
+            (self.borders.y1 + padding, self.borders.y2 - padding - 1),
+        )
+
     # Map generation functions
 
-    def add_room(self, new_room: RectangularRoom) -> None:
+    def add_room(self, new_room: RectangularRoom) -> bool:
+        """Add a room if it fits inside the borders, returning True if it did"""
         room = Room(new_room)
 
         if not self.in_limits(new_room):
-            return
+            return False
 
         self.rooms.append(room)
+        if room.is_room:
+            self.frontier.add(room)
 
-        for x in range(new_room.position.x, new_room.end.x):
-            for y in range(new_room.position.y, new_room.end.y):
-                self._set_data(x, y, room)
+        # The room is inside the borders, so all of it can be stamped at once
+        self.grid[new_room.inner] = len(self.rooms)
+
+        return True
 
     def add_random_corridor(
         self, room: Room, length: int, connecting: bool
@@ -307,6 +411,8 @@ class Dungeon:
         k = k[0]
 
         room.ready_walls.pop(k)
+        if not walls:
+            self.frontier.discard(room)
 
         # Set up the direction to send corridor based on chosen wall
         starting_room: RectangularRoom = room.room
@@ -339,73 +445,82 @@ class Dungeon:
             )
             direction = Point.LEFT()
 
-        # Check to see if the new corridor is going to intersect anything
-        todo: list[dict] = []
-        touched_another_room: bool = False
-
         if not position or not direction:
             return
 
-        for _ in range(length):
-            position += direction
+        # Check to see if the new corridor is going to intersect anything
+        probe = self.probe_corridor(position, direction, length)
 
-            # Ensure we are not outside the map
-            if not self.in_limits(
-                RectangularRoom(position.x, position.y, 1, 1).grow(self.padding)
-            ):
-                return
+        if probe is None:
+            return  # The corridor would leave the map before reaching anything
 
-            # Grab room data, if available
-            r = self.get_data(position.x, position.y)
-
-            if not r:
-                todo.append(
-                    {
-                        "position": position,
-                        "val": {
-                            "isCorridor": True,
-                            "room": RectangularRoom(position.x, position.y, 1, 1),
-                        },
-                    }
-                )
-            else:
-                touched_another_room = True
-                break
+        free, touched_another_room = probe
 
         if touched_another_room or not connecting:
-            for i in range(len(todo)):
-                t = todo[i]
-                t_pos = t["position"]
-                self._set_data(t_pos.x, t_pos.y, t["val"])
-                self.corridors.append(t_pos)
-
-            if not touched_another_room:
-                return position
-            else:
+            corridor = self.corridor_slice(position, direction, free)
+            self.grid[corridor] = CORRIDOR
+
+            if touched_another_room:
                 return
 
-        return position
+        return Point(
+            position.x + direction.x * length, position.y + direction.y * length
+        )
 
-    def get_random_room(self) -> Room:
-        return self.rooms[random.randrange(len(self.rooms))]
+    def probe_corridor(
+        self, position: Point, direction: Point, length: int
+    ) -> Optional[tuple[int, bool]]:
+        """
+        Return how many cells of a corridor are free and whether it touches anything
+
+        The corridor runs length cells from position, not including position, and
+        is checked as one slice of the grid.  None is returned if the corridor comes
+        too close to the borders before reaching a room or another corridor.
+        """
+        if direction.x:
+            start, across = position.x, position.y
+            (low, high), (across_low, across_high) = self.corridor_limits
+        else:
+            start, across = position.y, position.x
+            (across_low, across_high), (low, high) = self.corridor_limits
 
-    # Helper functions
+        step = direction.x + direction.y
+
+        # Steps within the limits are all in a row, starting with the first one
+        if across_low <= across <= across_high and low <= start + step <= high:
+            reach = min(length, high - start if step > 0 else start - low)
+        else:
+            return None if length else (0, False)
+
+        cells = self.grid[self.corridor_slice(position, direction, reach)]
+        if step < 0:
+            cells = cells[::-1]
+
+        taken = np.flatnonzero(cells)
+        if taken.size:
+            return int(taken[0]), True
+
+        if reach < length:
+            return None
+
+        return length, False
 
     @staticmethod
-    def _key(x, y):
-        return f"{x}:{y}"
+    def corridor_slice(
+        position: Point, direction: Point, length: int
+    ) -> tuple[Union[int, slice], Union[int, slice]]:
+        """Return the grid index of the length cells stepping from position"""
 
-    def get_data(self, x, y):
-        return self.data.get(self._key(x, y))
+        def axis(start: int, step: int) -> Union[int, slice]:
+            if step > 0:
+                return slice(start + 1, start + 1 + length)
+            if step < 0:
+                return slice(start - length, start)
+            return start
 
-    def _set_data(self, x, y, val):
-        if self.borders.has_point(x, y):
-            self.data[self._key(x, y)] = val
-        else:
-            return
+        return axis(position.x, direction.x), axis(position.y, direction.y)
 
-    def _remove_data(self, x, y, _val):
-        self.data.pop(self._key(x, y))
+    # Helper functions
 
     def in_limits(self, room: RectangularRoom):
         return self.borders.encloses(room)
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import random
-from typing import TYPE_CHECKING, Iterator
+from typing import TYPE_CHECKING, Iterator, Optional
 
+import numpy as np
 import tcod
 
 import entity_factories
@@ -44,6 +45,58 @@ class RectangularRoom:
         )
 
 
+class RoomPlacer:
+    """
+    Find random places for rooms which do not intersect any room placed before them
+
+    Placed rooms are marked on an occupancy grid, edges included as intersects
+    counts them, and a summed-area table of the grid tests every position of a
+    new room at once.
+    """
+
+    def __init__(self, width: int, height: int, padding: int) -> None:
+        self.width = width
+        self.height = height
+        self.padding = padding
+
+        self.occupied = np.zeros((width, height), dtype=np.int32)
+
+        # Occupied cells above and to the left of every cell, with a row of zeros
+        self.table = np.zeros((width + 1, height + 1), dtype=np.int32)
+
+    def place(self, room: RectangularRoom) -> None:
+        """Mark a room as taken, along with its edges"""
+        self.occupied[room.x1 : room.x2 + 1, room.y1 : room.y2 + 1] = 1
+        self.table[1:, 1:] = self.occupied.cumsum(axis=0).cumsum(axis=1)
+
+    def random_room(self, width: int, height: int) -> Optional[RectangularRoom]:
+        """Return a room of this size at a random free position, or None if none are"""
+        x, y = self.padding, self.padding
+        columns = self.width - self.padding * 2 - width
+        rows = self.height - self.padding * 2 - height
+
+        if columns <= 0 or rows <= 0:
+            return None
+
+        # Occupied cells of the room and its edges at every position at once
+        table = self.table
+        x2, y2 = x + width + 1, y + height + 1
+        taken = (
+            table[x2 : x2 + columns, y2 : y2 + rows]
+            - table[x : x + columns, y2 : y2 + rows]
+            - table[x2 : x2 + columns, y : y + rows]
+            + table[x : x + columns, y : y + rows]
+        )
+
+        free = np.flatnonzero(taken == 0)
+        if not free.size:
+            return None
+
+        column, row = divmod(int(free[random.randrange(free.size)]), rows)
+
+        return RectangularRoom(x + column, y + row, width, height)
+
+
 def place_entities(
     room: RectangularRoom,
     dungeon: GameMap,
@@ -68,7 +121,7 @@ def place_entities(
         x = random.randint(room.x1 + 1, room.x2 - 1)
         y = random.randint(room.y1 + 1, room.y2 - 1)
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+        if not dungeon.get_entities_at_location(x, y):
             entity.spawn(dungeon, x, y)
 
 
@@ -134,26 +187,35 @@ def generate_dungeon(
     padding: int = 4,
 ) -> GameMap:
     """Generate a new dungeon map using randomly placed non-overlapping rooms"""
-    """We may generate fewer than max rooms due to room collisions"""
+    """Fewer than max rooms are only generated when no more rooms fit"""
     player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+    dungeon = GameMap(
+        engine,
+        map_width,
+        map_height,
+        entities=[player],
+        chunk_size=engine.game_world.chunk_size,
+        spill_dir=engine.game_world.spill_dir,
+    )
 
     rooms: list[RectangularRoom] = []
+    placer = RoomPlacer(dungeon.width, dungeon.height, padding)
 
-    for r in range(max_rooms):
+    while len(rooms) < max_rooms:
         room_width = random.randint(room_min_size, room_max_size)
         room_height = random.randint(room_min_size, room_max_size)
 
         # Randomly position the room ensuring some padding around the map edges
-        x = random.randint(padding, dungeon.width - padding - room_width - 1)
-        y = random.randint(padding, dungeon.height - padding - room_height - 1)
+        new_room = placer.random_room(room_width, room_height)
 
-        new_room = RectangularRoom(x, y, room_width, room_height)
+        if new_room is None:
+            # No room for a room this size, the smallest fits anywhere any room does
+            new_room = placer.random_room(room_min_size, room_min_size)
 
-        # Run through the other rooms and see if they intersect with this one
-        if any(new_room.intersects(other_room) for other_room in rooms):
-            # new_room intersects with another room, so generate a new one
-            continue
+            if new_room is None:
+                break  # The map is full
+
+        placer.place(new_room)
 
         # Dig out this new room
         dungeon.tiles[new_room.inner] = tile_types.floor
@@ -182,4 +244,6 @@ def generate_dungeon(
         # Add the new room to the list of valid rooms in the dungeon
         rooms.append(new_room)
 
+    dungeon.tiles_changed()
+
     return dungeon
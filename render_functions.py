@@ -19,9 +19,7 @@ def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
     if not game_map.in_bounds(x, y) or not game_map.visible[x, y]:
         return ""
 
-    names = ", ".join(
-        entity.name for entity in game_map.entities if entity.x == x and entity.y == y
-    )
+    names = ", ".join(entity.name for entity in game_map.get_entities_at_location(x, y))
 
     return names.capitalize()
 
@@ -44,7 +42,11 @@ def render_bar(
 
 
 def render_bar_classic(
-    console: Console, current_value: int, maximum_value: int, total_width: int
+    console: Console,
+    current_value: int,
+    maximum_value: int,
+    total_width: int,
+    location: tuple[int, int] = (1, 45),
 ) -> None:
 
     padding = len(str(maximum_value))
@@ -64,7 +66,8 @@ def render_bar_classic(
         display_percentage=False,
     )
 
-    console.print(x=1, y=45, string=new_bar, alignment=tcod.LEFT)
+    x, y = location
+    console.print(x=x, y=y, string=new_bar, alignment=tcod.LEFT)
 
 
 def render_dungeon_level(
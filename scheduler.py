@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import heapq
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+# Time taken by one action of an actor with normal speed
+TURN_LENGTH = 100
+
+
+class TurnScheduler:
+    """
+    Decide the order actors act in using a priority queue keyed by the time of their next action
+
+    Faster actors come due more often than slower ones and actors which are not
+    scheduled are never looked at.  Timed events can be queued alongside actors.
+    """
+
+    def __init__(self) -> None:
+        self.time = 0
+
+        # Entries are [time, sequence, actor, event], sequence breaks ties in queue order
+        self.queue: list[list] = []
+        self.entries: dict[Actor, list] = {}
+        self.next_sequence = 0
+
+        # Actors taken out of the queue until they are woken, with the time they fell asleep
+        self.sleeping: dict[Actor, int] = {}
+
+    @staticmethod
+    def delay_for(actor: Actor) -> int:
+        """Return the time an actor's action takes based on its speed"""
+        return TURN_LENGTH * 100 // actor.speed
+
+    def _push(
+        self,
+        time: int,
+        actor: Optional[Actor] = None,
+        event: Optional[Callable[[], None]] = None,
+    ) -> list:
+        entry = [time, self.next_sequence, actor, event]
+        self.next_sequence += 1
+        heapq.heappush(self.queue, entry)
+        return entry
+
+    def add(self, actor: Actor, delay: Optional[int] = None) -> None:
+        """Schedule an actor to act after a delay, by default the length of its action"""
+        self.remove(actor)
+        self.sleeping.pop(actor, None)
+
+        if delay is None:
+            delay = self.delay_for(actor)
+
+        self.entries[actor] = self._push(self.time + delay, actor=actor)
+
+    def remove(self, actor: Actor) -> None:
+        """Unschedule an actor, its queue entry is skipped once it comes up"""
+        entry = self.entries.pop(actor, None)
+
+        if entry:
+            entry[2] = None
+
+        self.sleeping.pop(actor, None)
+
+    def sleep(self, actor: Actor) -> None:
+        """Stop scheduling an actor until it is woken"""
+        self.remove(actor)
+        self.sleeping[actor] = self.time
+
+    def wake(self, actor: Actor) -> int:
+        """Schedule a sleeping actor to act now and return how many turns it slept"""
+        asleep_since = self.sleeping.pop(actor)
+        self.add(actor, delay=0)
+
+        return (self.time - asleep_since) // self.delay_for(actor)
+
+    def delay_for_turns(self, actor: Actor, turns: int) -> int:
+        """Return the delay until an actor has taken the given number of turns"""
+        delay = turns * self.delay_for(actor)
+        entry = self.entries.get(actor)
+
+        if entry:
+            # Count from the actor's next turn rather than from now
+            delay += entry[0] - self.time
+
+        return delay
+
+    def schedule_event(self, delay: int, event: Callable[[], None]) -> None:
+        """Call event once the given amount of time has passed"""
+        self._push(self.time + delay, event=event)
+
+    def next_is_event(self) -> bool:
+        """Return True if the next entry in the queue is an event rather than an actor"""
+        return bool(self.queue) and self.queue[0][3] is not None
+
+    def end_turn(self, actor: Actor) -> None:
+        """Advance time to an actor's turn and reschedule it after it has acted"""
+        entry = self.entries.get(actor)
+
+        if entry:
+            self.time = max(self.time, entry[0])
+            self.add(actor)
+
+    def actors_before(self, actor: Actor) -> Iterator[Actor]:
+        """
+        Yield each actor due to act before the given actor's next turn, in order
+
+        Every actor yielded is already rescheduled for its next action.  Events
+        are called as they come due.
+        """
+        entry = self.entries.get(actor)
+
+        if entry:
+            stop = entry[0], entry[1]
+        else:
+            # The actor is no longer scheduled (dead), run out a turn of its length
+            stop = self.time + TURN_LENGTH, self.next_sequence
+
+        queue = self.queue
+
+        while queue and (queue[0][0], queue[0][1]) < stop:
+            time, _, queued_actor, event = queue[0]
+            self.time = time
+
+            if queued_actor:
+                # Replace the entry with the actor's next turn in a single heap operation
+                entry = [
+                    time + self.delay_for(queued_actor),
+                    self.next_sequence,
+                    queued_actor,
+                    None,
+                ]
+                self.next_sequence += 1
+                self.entries[queued_actor] = entry
+                heapq.heapreplace(queue, entry)
+                yield queued_actor
+            else:
+                heapq.heappop(queue)
+
+                if event:
+                    event()
+                # Otherwise the actor was removed while it was queued
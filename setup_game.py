@@ -4,7 +4,7 @@ import copy
 import lzma
 import pickle
 import traceback
-from typing import Optional
+from typing import Hashable, Optional
 
 import tcod
 
@@ -67,7 +67,18 @@ def load_game(filename: str) -> Engine:
 class MainMenu(input_handlers.BaseEventHandler):
     """Handle the main menu rendering and input."""
 
+    def __init__(self) -> None:
+        self.cache = input_handlers.RenderCache()
+
+    @property
+    def render_key(self) -> Optional[Hashable]:
+        return type(self)  # The menu never changes
+
     def on_render(self, console: tcod.Console) -> None:
+        """Render the main menu, drawing it only the first time"""
+        self.cache.render(console, self.render_key, self.render_menu)
+
+    def render_menu(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
         console.draw_semigraphics(background_image, 0, 0)
 
@@ -22,15 +22,24 @@ tile_dt = np.dtype(
 )
 
 
+# Registry of every tile type, maps store the index of a tile type in this table
+tile_table = np.empty(0, dtype=tile_dt)
+
+
 def new_tile(
     *,  # Force use of keyword arguments
     walkable: bool,
     transparent: bool,
     dark: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
     light: Tuple[int, Tuple[int, int, int], Tuple[int, int, int]],
-) -> np.ndarray:  # type: ignore
-    """Helper function for defining individual tile types"""
-    return np.array((walkable, transparent, dark, light), dtype=tile_dt)
+) -> int:
+    """Helper function for defining individual tile types, returns the tile ID"""
+    global tile_table
+
+    tile = np.array((walkable, transparent, dark, light), dtype=tile_dt)
+    tile_table = np.append(tile_table, tile)
+
+    return len(tile_table) - 1
 
 
 # SHROUD represents unexplored, unseen tiles